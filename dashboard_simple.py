@@ -3,10 +3,18 @@ import pandas as pd
 import numpy as np
 import plotly.express as px
 import plotly.graph_objects as go
+from plotly.colors import get_colorscale
+import pyarrow as pa
+import os
+import faulthandler
 from datetime import datetime
 import warnings
 warnings.filterwarnings('ignore')
 
+# 致命的なクラッシュ時にトレースバックを出力（再実行ごとに有効化し直さない）
+if not faulthandler.is_enabled():
+    faulthandler.enable()
+
 # ページ設定
 st.set_page_config(
     page_title="Superstore Dashboard",
@@ -15,20 +23,129 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# データ読み込み関数
-@st.cache_data
-def load_data():
+# 分析レポートの固定表（再実行のたびにDataFrameを作らず、Arrow形式で一度だけ構築）
+REPORT_LOSS_PRODUCTS = pa.table({
+    '商品': ['Tables', 'Bookcases', 'Supplies'],
+    '利益率': ['-8.56%', '-3.02%', '-2.55%'],
+    '損失額': ['$17,725', '$3,473', '$1,189']
+})
+REPORT_CATEGORY_MARGINS = pa.table({
+    'カテゴリ': ['Furniture', 'Office Supplies', 'Technology'],
+    '利益率': ['2.49%', '17.04%', '17.40%']
+})
+REPORT_DISCOUNT_LOSSES = pa.table({
+    '割引率': ['50%', '60%', '70%', '80%'],
+    '平均損失/件': ['$310', '$43', '$96', '$102']
+})
+REPORT_REGION_MARGINS = pa.table({
+    '地域': ['West', 'East', 'South', 'Central'],
+    '利益率': ['14.94%', '13.48%', '11.93%', '7.92%']
+})
+REPORT_DISCOUNT_LIMITS = pa.table({
+    'カテゴリ': ['Furniture', 'Office Supplies', 'Technology'],
+    '現在上限': ['50%', '80%', '70%'],
+    '推奨上限': ['15%', '25%', '30%']
+})
+
+# 棒グラフのカラースケール（名前からの解決を描画のたびに行わず、起動時に一度だけ展開）
+COLOR_SCALES = {name: get_colorscale(name) for name in ['Blues', 'Reds', 'RdYlGn']}
+
+# フッター（区切り線と本文を1回のmarkdownで描画）
+FOOTER_HTML = """
+---
+
+<div style='text-align: center'>
+<p><strong>Superstore Analytics Dashboard</strong></p>
+<p>Built with ❤️ using Streamlit & Plotly</p>
+</div>
+"""
+
+# 割引率の区間（0〜1を5等分した固定区間と表示ラベルを一度だけ作成）
+DISCOUNT_BIN_EDGES = np.linspace(0, 1, 6)
+DISCOUNT_BIN_LABELS = np.array([
+    f"{DISCOUNT_BIN_EDGES[i]:.2f}–{DISCOUNT_BIN_EDGES[i + 1]:.2f}"
+    for i in range(len(DISCOUNT_BIN_EDGES) - 1)
+])
+
+# 日付変換（Superstoreの M/D/YYYY 形式を指定して高速に解析し、形式が異なる場合のみ推定に戻す）
+def parse_dates(series):
+    """日付列の変換"""
+    parsed = pd.to_datetime(series, format='%m/%d/%Y', errors='coerce', cache=True)
+    if parsed.isna().sum() > series.isna().sum():
+        parsed = pd.to_datetime(series, errors='coerce', cache=True)
+    return parsed
+
+# 派生指標の計算（NumPy配列上で一括処理し、pandasの中間Seriesを作らない）
+def compute_derived_metrics(sales, profit, order_dates, ship_dates):
+    """利益率(%)と配送日数の計算"""
+    # ゼロ除算を避けて利益率を計算し、-1000%から1000%に制限
+    profit_margin = np.zeros_like(sales)
+    np.divide(profit, sales, out=profit_margin, where=(sales != 0))
+    profit_margin *= 100
+    np.round(profit_margin, 2, out=profit_margin)
+    np.clip(profit_margin, -1000, 1000, out=profit_margin)
+
+    # 配送日数（日付が欠損している行は0日）
+    shipping_delta = ship_dates - order_dates
+    shipping_days = np.zeros(len(shipping_delta), dtype=np.int64)
+    valid_delta = ~np.isnat(shipping_delta)
+    shipping_days[valid_delta] = shipping_delta[valid_delta] // np.timedelta64(1, 'D')
+
+    return profit_margin, shipping_days
+
+# 前処理済みデータのキャッシュ（元CSVと同じ場所にFeather形式で保存）
+def get_cache_path(filename):
+    """キャッシュファイルのパス"""
+    return os.path.splitext(filename)[0] + '.cache.feather'
+
+def read_cached_data(filename):
+    """元CSVと本スクリプトより新しいキャッシュがあれば読み込む"""
+    cache_path = get_cache_path(filename)
     try:
-        # 複数のファイル名とエンコーディングを試行
-        file_options = [
-            ('Sample - Superstore.csv', 'latin-1'),
-            ('Superstore.csv', 'latin-1')
-        ]
+        source_mtime = max(os.path.getmtime(filename), os.path.getmtime(__file__))
+        if os.path.getmtime(cache_path) > source_mtime:
+            return pd.read_feather(cache_path)
+    except (OSError, ImportError, ValueError):
+        pass
+    return None
+
+def write_cached_data(df, filename):
+    """前処理済みデータをキャッシュに保存（失敗しても表示には影響させない）"""
+    try:
+        df.reset_index(drop=True).to_feather(get_cache_path(filename))
+    except (OSError, ImportError, ValueError):
+        pass
+
+# 読み込み候補のデータファイルとエンコーディング
+DATA_FILE_OPTIONS = [
+    ('Sample - Superstore.csv', 'latin-1'),
+    ('Superstore.csv', 'latin-1')
+]
+
+def get_data_version():
+    """データファイルの更新時刻（キャッシュの無効化キー）"""
+    return tuple(
+        os.path.getmtime(filename) if os.path.exists(filename) else None
+        for filename, _ in DATA_FILE_OPTIONS
+    )
 
+# データ読み込み関数（プロセス再起動後はFeatherキャッシュから復元）
+@st.cache_data(show_spinner=False)
+def load_data(data_version):
+    try:
+        # 複数のファイル名とエンコーディングを試行
         df = None
-        for filename, encoding in file_options:
+        source_file = None
+        for filename, encoding in DATA_FILE_OPTIONS:
+            # 前処理済みキャッシュがあればCSVの解析と前処理を省略
+            cached_df = read_cached_data(filename)
+            if cached_df is not None:
+                st.success(f"✅ データファイル '{filename}' を読み込みました")
+                return cached_df
+
             try:
                 df = pd.read_csv(filename, encoding=encoding)
+                source_file = filename
                 st.success(f"✅ データファイル '{filename}' を読み込みました")
                 break
             except (FileNotFoundError, UnicodeDecodeError):
@@ -53,56 +170,178 @@ def load_data():
     # 日付変換と追加的な特徴量作成
     try:
         # 日付変換
-        df['Order Date'] = pd.to_datetime(df['Order Date'], errors='coerce')
+        df['Order Date'] = parse_dates(df['Order Date'])
         if 'Ship Date' in df.columns:
-            df['Ship Date'] = pd.to_datetime(df['Ship Date'], errors='coerce')
+            df['Ship Date'] = parse_dates(df['Ship Date'])
         else:
             df['Ship Date'] = df['Order Date']  # Ship Dateがない場合はOrder Dateを使用
 
-        # 無効な日付を除去
+        # 無効な日付を除去し、注文日順に並べる（年・年月の集計を連続区間の合計で行うため）
         df = df.dropna(subset=['Order Date'])
+        df = df.sort_values('Order Date', kind='stable', ignore_index=True)
 
         # 基本的な時間特徴量
         df['Year'] = df['Order Date'].dt.year
         df['Month'] = df['Order Date'].dt.month
         df['Quarter'] = df['Order Date'].dt.quarter
         df['Weekday'] = df['Order Date'].dt.day_name()
-        df['YearMonth'] = df['Order Date'].dt.to_period('M').astype(str)
-
-        # 配送日数計算
-        df['Shipping_Days'] = (df['Ship Date'] - df['Order Date']).dt.days
-        df['Shipping_Days'] = df['Shipping_Days'].fillna(0)  # NaN値を0に置換
+        df['YearMonth'] = df['Order Date'].dt.strftime('%Y-%m').astype('category')
 
     except Exception as e:
         st.error(f"日付処理エラー: {str(e)}")
         st.stop()
 
-    # 安全な利益率計算
-    try:
-        df['Profit_Margin'] = 0.0
-        # ゼロ除算を避けて利益率を計算
-        valid_sales_mask = (df['Sales'] != 0) & (df['Sales'].notna()) & (df['Profit'].notna())
-        if valid_sales_mask.any():
-            df.loc[valid_sales_mask, 'Profit_Margin'] = (
-                df.loc[valid_sales_mask, 'Profit'] / df.loc[valid_sales_mask, 'Sales'] * 100
-            ).round(2)
+    # データ型の確認と修正
+    numeric_columns = ['Sales', 'Profit', 'Quantity', 'Discount']
+    for col in numeric_columns:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0)
 
-        # 無限値と異常値を修正
-        df['Profit_Margin'] = df['Profit_Margin'].replace([np.inf, -np.inf], 0)
-        df['Profit_Margin'] = df['Profit_Margin'].clip(-1000, 1000)  # -1000%から1000%に制限
+    # 利益率と配送日数の計算
+    try:
+        profit_margin, shipping_days = compute_derived_metrics(
+            df['Sales'].to_numpy(dtype=np.float64),
+            df['Profit'].to_numpy(dtype=np.float64),
+            df['Order Date'].to_numpy(),
+            df['Ship Date'].to_numpy()
+        )
+        df['Profit_Margin'] = profit_margin
+        df['Shipping_Days'] = shipping_days
 
     except Exception as e:
         st.error(f"利益率計算エラー: {str(e)}")
         df['Profit_Margin'] = 0.0
+        df['Shipping_Days'] = 0
 
-    # データ型の確認と修正
-    numeric_columns = ['Sales', 'Profit', 'Quantity', 'Discount']
-    for col in numeric_columns:
+    # 数値列のダウンキャスト（金額列は合計の精度を保つためfloat64のまま）
+    for col in ['Discount', 'Profit_Margin']:
         if col in df.columns:
-            df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0)
+            df[col] = pd.to_numeric(df[col], downcast='float')
+    for col in ['Quantity', 'Shipping_Days', 'Year', 'Month', 'Quarter']:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], downcast='integer')
+
+    # 集計キーとなる低カーディナリティ列はカテゴリ型にしてコードで集計する
+    for col in ['Region', 'Category', 'Segment', 'Ship Mode', 'Sub-Category', 'Weekday']:
+        if col in df.columns:
+            df[col] = df[col].astype('category')
+
+    # ID列・商品名もカテゴリ型にして、文字列ハッシュではなく整数コードで集計する
+    for col in ['Customer ID', 'Order ID', 'Product Name']:
+        if col in df.columns:
+            df[col] = df[col].astype('category')
+
+    write_cached_data(df, source_file)
 
     return df
 
+# サイドバーの選択肢を取得（_dfはハッシュせず、データファイルの更新時刻をキーにする）
+@st.cache_data
+def get_filter_options(_df, data_version):
+    """フィルター選択肢の一括計算"""
+    options = {}
+    for col in ['Year', 'Region', 'Category', 'Segment', 'Ship Mode']:
+        if col in _df.columns:
+            options[col] = tuple(sorted(_df[col].dropna().unique().tolist()))
+        else:
+            options[col] = ()
+    return options
+
+# カテゴリ別合計（groupbyの代わりにカテゴリコードをnp.bincountで集計）
+def sum_by_category(data, key_col, value_col, mask=None):
+    """カテゴリ型の列をキーにした合計"""
+    keys = data[key_col]
+    codes = keys.cat.codes.to_numpy()
+    valid = codes >= 0
+    if mask is not None:
+        valid &= mask
+    n_categories = len(keys.cat.categories)
+    totals = np.bincount(codes[valid], weights=data[value_col].to_numpy()[valid], minlength=n_categories)
+    counts = np.bincount(codes[valid], minlength=n_categories)
+    observed = counts > 0
+    return pd.DataFrame({
+        key_col: keys.cat.categories[observed],
+        value_col: totals[observed]
+    })
+
+# カテゴリ別の合計・平均（カテゴリコードを一度だけ取り出し、各列をnp.bincountで集計）
+def sum_mean_by_category(data, key_col, value_cols):
+    """カテゴリ型の列をキーにした合計と平均"""
+    keys = data[key_col]
+    codes = keys.cat.codes.to_numpy()
+    valid = codes >= 0
+    codes = codes[valid]
+    n_categories = len(keys.cat.categories)
+    counts = np.bincount(codes, minlength=n_categories)
+    observed = counts > 0
+
+    result = {}
+    for col in value_cols:
+        totals = np.bincount(codes, weights=data[col].to_numpy()[valid], minlength=n_categories)[observed]
+        result[(col, 'sum')] = totals
+        result[(col, 'mean')] = totals / counts[observed]
+    return pd.DataFrame(result, index=pd.Index(keys.cat.categories[observed], name=key_col))
+
+# 区間番号ごとの平均（合計と件数をnp.bincountで1回ずつ求め、データのある区間だけ返す）
+def bin_mean(codes, values, n_bins):
+    """区間別平均"""
+    sums = np.bincount(codes, weights=values, minlength=n_bins)
+    counts = np.bincount(codes, minlength=n_bins)
+    observed = counts > 0
+    return sums[observed] / counts[observed], observed
+
+# 並び順どおりのキー別合計（注文日順のデータでは年・年月が連続するため、境界ごとにnp.add.reduceatで集計）
+def sum_by_sorted_key(data, key_col, value_cols):
+    """整列済みキーの区間別合計"""
+    keys = data[key_col]
+    key_values = keys.cat.codes.to_numpy() if isinstance(keys.dtype, pd.CategoricalDtype) else keys.to_numpy()
+    if len(key_values) == 0:
+        return pd.DataFrame({col: [] for col in [key_col] + value_cols})
+    starts = np.flatnonzero(np.r_[True, key_values[1:] != key_values[:-1]])
+
+    result = {key_col: keys.to_numpy()[starts]}
+    for col in value_cols:
+        result[col] = np.add.reduceat(data[col].to_numpy(dtype=np.float64), starts)
+    return pd.DataFrame(result)
+
+# カテゴリ別の件数とユニーク数（キーと値のカテゴリコードの組をnp.uniqueで数える）
+def count_nunique_by_category(data, key_col, value_col):
+    """カテゴリ型の列をキーにした件数とユニーク数"""
+    keys = data[key_col]
+    key_codes = keys.cat.codes.to_numpy()
+    value_codes = data[value_col].cat.codes.to_numpy()
+    n_categories = len(keys.cat.categories)
+    n_values = len(data[value_col].cat.categories)
+    observed = np.bincount(key_codes[key_codes >= 0], minlength=n_categories) > 0
+
+    valid = (key_codes >= 0) & (value_codes >= 0)
+    key_codes = key_codes[valid].astype(np.int64)
+    counts = np.bincount(key_codes, minlength=n_categories)
+    pairs = np.unique(key_codes * n_values + value_codes[valid])
+    nunique = np.bincount(pairs // n_values, minlength=n_categories)
+    return counts[observed], nunique[observed]
+
+# カテゴリ別合計の上位n件（全件ソートせずnp.argpartitionで部分選択）
+def top_by_category(data, key_col, value_col, n=10):
+    """カテゴリ別合計の上位n件"""
+    totals = sum_by_category(data, key_col, value_col)
+    values = totals[value_col].to_numpy()
+    if len(values) > n:
+        top_idx = np.argpartition(values, -n)[-n:]
+    else:
+        top_idx = np.arange(len(values))
+    top_idx = top_idx[np.argsort(values[top_idx])[::-1]]
+    return totals.iloc[top_idx].reset_index(drop=True)
+
+# ユニーク数（カテゴリ型ならコードの出現をnp.bincountで数え、ソートを避ける）
+def fast_nunique(series):
+    """高速なユニーク数計算"""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        codes = series.cat.codes.to_numpy()
+        counts = np.bincount(codes[codes >= 0], minlength=len(series.cat.categories))
+        return int(np.count_nonzero(counts))
+    return len(pd.unique(series.dropna().to_numpy()))
+
 # 安全なグラフ作成関数
 def safe_histogram(data, column, title, nbins=50, x_label=None, y_label='頻度'):
     """安全なヒストグラム作成"""
@@ -128,31 +367,89 @@ def safe_histogram(data, column, title, nbins=50, x_label=None, y_label='頻度'
         st.error(f"{title}の作成でエラー: {str(e)}")
         return None
 
-def safe_scatter(data, x_col, y_col, color_col=None, title="", sample_size=1000):
+# 散布図用の間引き（色グループごとにx順のバケットへ分け、各バケットのyの最小・最大の行を残す。結果はn_out行以下）
+def downsample_extrema(data, x_col, y_col, color_col=None, n_out=1000):
+    """極値を保持した間引き"""
+    n = len(data)
+    if n <= n_out:
+        return data
+
+    x = data[x_col].to_numpy(dtype=np.float64)
+    y = data[y_col].to_numpy(dtype=np.float64)
+    if color_col:
+        codes = pd.factorize(data[color_col], sort=True)[0]
+    else:
+        codes = np.zeros(n, dtype=np.intp)
+
+    # グループ→x の順に並べ、各グループに1つずつ、残りは件数に比例してバケット数を割り当てる
+    # （1バケット最大2行なので、バケット総数をn_out // 2以内に収める）
+    order = np.lexsort((x, codes))
+    sorted_codes = codes[order]
+    counts = np.bincount(sorted_codes)
+    budget = max(0, n_out // 2 - len(counts))
+    n_buckets = 1 + counts * budget // n
+    group_starts = np.cumsum(counts) - counts
+    bucket_starts = np.cumsum(n_buckets) - n_buckets
+    rank = np.arange(n) - group_starts[sorted_codes]
+    bucket = bucket_starts[sorted_codes] + rank * n_buckets[sorted_codes] // counts[sorted_codes]
+
+    # バケット内をyで並べ、先頭（最小）と末尾（最大）の行を採用
+    by_y = np.lexsort((y[order], bucket))
+    sorted_bucket = bucket[by_y]
+    first = np.flatnonzero(np.r_[True, sorted_bucket[1:] != sorted_bucket[:-1]])
+    last = np.r_[first[1:] - 1, n - 1]
+    keep = np.unique(order[by_y[np.r_[first, last]]])
+
+    # グループ数がn_out // 2を超える場合のみ上限を超えるので、行順に等間隔で間引く
+    if len(keep) > n_out:
+        keep = keep[np.linspace(0, len(keep) - 1, n_out).astype(np.intp)]
+    return data.iloc[keep]
+
+# 大量データ用の密度ヒートマップ（サーバー側で2次元ヒストグラムに集計し、点を送らない）
+def density_heatmap(x, y, x_label, y_label, title, bins=(60, 40)):
+    """2次元密度ヒートマップ作成"""
+    counts, x_edges, y_edges = np.histogram2d(x, y, bins=bins)
+    fig = go.Figure(go.Heatmap(
+        z=np.where(counts > 0, counts, np.nan).T,
+        x=(x_edges[:-1] + x_edges[1:]) / 2,
+        y=(y_edges[:-1] + y_edges[1:]) / 2,
+        colorscale='Viridis',
+        colorbar={'title': '件数'}
+    ))
+    fig.update_layout(title=title, xaxis_title=x_label, yaxis_title=y_label)
+    return fig
+
+def safe_scatter(data, x_col, y_col, color_col=None, title="", sample_size=1000,
+                 density_threshold=20_000):
     """安全な散布図作成"""
     try:
-        # データのサンプリングと前処理
-        if len(data) > sample_size:
-            sample_data = data.sample(n=sample_size, random_state=42)
-        else:
-            sample_data = data.copy()
-
         # 必要な列の存在確認
         required_cols = [x_col, y_col]
         if color_col:
             required_cols.append(color_col)
 
-        missing_cols = [col for col in required_cols if col not in sample_data.columns]
+        missing_cols = [col for col in required_cols if col not in data.columns]
         if missing_cols:
             st.warning(f"列が見つかりません: {missing_cols}")
             return None
 
         # NaN値と異常値を除去
-        sample_data = sample_data.dropna(subset=required_cols)
+        sample_data = data.dropna(subset=required_cols)
         if len(sample_data) == 0:
             st.warning(f"{title}: 有効なデータがありません")
             return None
 
+        # 件数が非常に多い場合は点ではなく密度で表示
+        if len(sample_data) > density_threshold:
+            return density_heatmap(
+                sample_data[x_col].to_numpy(dtype=np.float64),
+                sample_data[y_col].to_numpy(dtype=np.float64),
+                x_col, y_col, title
+            )
+
+        # 点数の上限（ランダム抽出ではなく各区間の極値を残して分布の外形を保つ）
+        sample_data = downsample_extrema(sample_data, x_col, y_col, color_col, sample_size)
+
         # 散布図作成
         fig_kwargs = {
             'data_frame': sample_data,
@@ -172,10 +469,688 @@ def safe_scatter(data, x_col, y_col, color_col=None, title="", sample_size=1000)
         st.error(f"{title}の作成でエラー: {str(e)}")
         return None
 
+# 集計済みグラフの作成（graph_objectsで直接トレースを作り、小さな集計結果をキーにFigureをキャッシュ）
+@st.cache_resource(max_entries=256)
+def make_line_fig(x, y, x_name, y_name, title):
+    """折れ線グラフ作成"""
+    fig = go.Figure(go.Scatter(
+        x=x,
+        y=y,
+        mode='lines+markers',
+        hovertemplate=f"{x_name}=%{{x}}<br>{y_name}=%{{y}}<extra></extra>"
+    ))
+    fig.update_layout(title=title, xaxis_title=x_name, yaxis_title=y_name, xaxis_tickangle=-45)
+    fig.update_xaxes(type='category')
+    return fig
+
+@st.cache_resource(max_entries=256)
+def make_pie_fig(names, values, names_name, values_name, title, colors=None):
+    """円グラフ作成"""
+    trace_kwargs = {
+        'labels': names,
+        'values': values,
+        'hovertemplate': f"{names_name}=%{{label}}<br>{values_name}=%{{value}}<extra></extra>"
+    }
+
+    if colors:
+        trace_kwargs['marker'] = {'colors': [colors[i % len(colors)] for i in range(len(names))]}
+
+    fig = go.Figure(go.Pie(**trace_kwargs))
+    fig.update_layout(title=title)
+    return fig
+
+@st.cache_resource(max_entries=256)
+def make_bar_fig(x, y, x_name, y_name, title, color_scale=None, text_template=None,
+                 orientation='v', height=None, category_axis=False):
+    """棒グラフ作成"""
+    trace_kwargs = {
+        'x': x,
+        'y': y,
+        'orientation': orientation,
+        'hovertemplate': f"{x_name}=%{{x}}<br>{y_name}=%{{y}}<extra></extra>"
+    }
+
+    if color_scale:
+        trace_kwargs['marker'] = {
+            'color': y,
+            'colorscale': COLOR_SCALES.get(color_scale, color_scale),
+            'showscale': True,
+            'colorbar': {'title': y_name}
+        }
+    if text_template:
+        trace_kwargs['text'] = y
+        trace_kwargs['texttemplate'] = text_template
+        trace_kwargs['textposition'] = 'outside'
+
+    fig = go.Figure(go.Bar(**trace_kwargs))
+    fig.update_layout(title=title, xaxis_title=x_name, yaxis_title=y_name)
+    if height:
+        fig.update_layout(height=height)
+    if category_axis:
+        # 年などの数値ラベルを間引かず、1つずつ表示する
+        fig.update_xaxes(type='category', tickmode='linear', dtick=1)
+    return fig
+
+# フィルター条件別の集計（データ版とフィルター条件からなるfilter_keyをキャッシュキーにし、絞り込み済みデータはハッシュしない）
+@st.cache_data(max_entries=128)
+def get_monthly_sales(_filtered_df, filter_key):
+    """月別売上"""
+    return sum_by_sorted_key(_filtered_df, 'YearMonth', ['Sales'])
+
+@st.cache_data(max_entries=128)
+def get_region_aggregates(_filtered_df, filter_key):
+    """地域別の集計（売上・利益・割引率・顧客数を地域コード上で集計）"""
+    value_cols = [col for col in ['Sales', 'Profit', 'Discount'] if col in _filtered_df.columns]
+    region_agg = sum_mean_by_category(_filtered_df, 'Region', value_cols)
+    columns = [('Sales', 'sum'), ('Sales', 'mean'), ('Profit', 'sum'), ('Profit', 'mean')]
+    if 'Customer ID' in _filtered_df.columns:
+        _, customer_counts = count_nunique_by_category(_filtered_df, 'Region', 'Customer ID')
+        region_agg[('Customer ID', 'nunique')] = customer_counts
+        columns.append(('Customer ID', 'nunique'))
+    if 'Discount' in _filtered_df.columns:
+        columns.append(('Discount', 'mean'))
+    return region_agg[columns]
+
+@st.cache_data(max_entries=128)
+def get_category_aggregates(_filtered_df, filter_key):
+    """カテゴリ別の集計（売上合計と平均利益率を1回のgroupbyで計算）"""
+    return _filtered_df.groupby('Category', observed=True).agg({
+        'Sales': 'sum',
+        'Profit_Margin': 'mean'
+    })
+
+@st.cache_data(max_entries=128)
+def get_region_sales(_filtered_df, filter_key):
+    """地域別売上"""
+    region_agg = get_region_aggregates(_filtered_df, filter_key)
+    return pd.DataFrame({
+        'Region': region_agg.index,
+        'Sales': region_agg[('Sales', 'sum')].to_numpy()
+    })
+
+@st.cache_data(max_entries=128)
+def get_category_sales(_filtered_df, filter_key):
+    """カテゴリ別売上"""
+    category_agg = get_category_aggregates(_filtered_df, filter_key)
+    return category_agg['Sales'].reset_index()
+
+@st.cache_data(max_entries=128)
+def get_yearly_sales(_filtered_df, filter_key):
+    """年別売上・利益・注文数"""
+    yearly_sales = sum_by_sorted_key(_filtered_df, 'Year', ['Sales', 'Profit'])
+
+    if 'Order ID' in _filtered_df.columns:
+        yearly_orders = _filtered_df.groupby('Year', observed=True, sort=False)['Order ID'].nunique().reset_index()
+        yearly_sales = yearly_sales.merge(yearly_orders, on='Year', how='left')
+
+    return yearly_sales
+
+@st.cache_data(max_entries=128)
+def get_segment_sales(_filtered_df, filter_key):
+    """セグメント別売上"""
+    return sum_by_category(_filtered_df, 'Segment', 'Sales')
+
+@st.cache_data(max_entries=128)
+def get_top_products(_filtered_df, filter_key):
+    """売上トップ10製品"""
+    return top_by_category(_filtered_df, 'Product Name', 'Sales', n=10)
+
+# 損失注文の統計（損失マスクを一度だけ作り、件数・合計・平均・最小と地域/カテゴリ別損失額を計算）
+@st.cache_data(max_entries=128)
+def get_loss_stats(_filtered_df, filter_key):
+    """損失注文の統計"""
+    profit = _filtered_df['Profit'].to_numpy()
+    loss_mask = profit < 0
+    loss_profit = profit[loss_mask]
+
+    stats = {
+        'count': int(loss_profit.size),
+        'total': abs(float(loss_profit.sum())),
+        'mean': float(loss_profit.mean()) if loss_profit.size else 0.0,
+        'min': float(loss_profit.min()) if loss_profit.size else 0.0
+    }
+    for key_col in ['Region', 'Category']:
+        loss = sum_by_category(_filtered_df, key_col, 'Profit', mask=loss_mask)
+        loss['Profit'] = loss['Profit'].abs()
+        loss.columns = [key_col, 'Loss']
+        stats[key_col] = loss
+    return stats
+
+@st.cache_data(max_entries=128)
+def get_regional_analysis(_filtered_df, filter_key):
+    """地域別総合分析"""
+    regional_analysis = get_region_aggregates(_filtered_df, filter_key).round(2)
+
+    regional_analysis.columns = ['総売上', '平均売上', '総利益', '平均利益', '顧客数', '平均割引率']
+    regional_analysis['利益率'] = (regional_analysis['総利益'] / regional_analysis['総売上'] * 100).round(2)
+    regional_analysis['顧客単価'] = (regional_analysis['総売上'] / regional_analysis['顧客数']).round(2)
+    return regional_analysis
+
+@st.cache_data(max_entries=128)
+def get_shipping_analysis(_filtered_df, filter_key):
+    """配送方法別分析"""
+    shipping_analysis = _filtered_df.groupby('Ship Mode', observed=True).agg({
+        'Sales': 'sum',
+        'Profit': 'sum',
+        'Shipping_Days': 'mean'
+    }).round(2)
+
+    if 'Order ID' in _filtered_df.columns:
+        order_counts, _ = count_nunique_by_category(_filtered_df, 'Ship Mode', 'Order ID')
+        shipping_analysis['注文数'] = order_counts
+
+    shipping_analysis.columns = ['売上', '利益', '平均配送日数', '注文数']
+    shipping_analysis['利益率'] = (shipping_analysis['利益'] / shipping_analysis['売上'] * 100).round(2)
+    return shipping_analysis
+
+@st.cache_data(max_entries=128)
+def get_category_profit(_filtered_df, filter_key):
+    """カテゴリ別平均利益率"""
+    category_agg = get_category_aggregates(_filtered_df, filter_key)
+    return category_agg['Profit_Margin'].reset_index().dropna()
+
+# 割引分析の事前チェック（集計前に列と有効な割引率の件数を確認し、問題があればメッセージを返す）
+@st.cache_data(max_entries=128)
+def validate_discount_data(_filtered_df, filter_key):
+    """割引データの検証"""
+    missing_cols = [col for col in ['Discount', 'Profit_Margin'] if col not in _filtered_df.columns]
+    if missing_cols:
+        return f"列が見つかりません: {missing_cols}"
+    discount = _filtered_df['Discount'].to_numpy()
+    if np.count_nonzero((discount >= 0) & (discount <= 1)) <= 5:  # 最低5件のデータが必要
+        return "割引データが不十分です"
+    return None
+
+# 割引率区間別の集計（filter_keyにデータ版を含むため、CSVが更新されれば再計算される）
+@st.cache_data(max_entries=128)
+def get_discount_margin(_filtered_df, filter_key):
+    """割引率区間別の平均利益率"""
+    discount = _filtered_df['Discount'].to_numpy()
+    margin = _filtered_df['Profit_Margin'].to_numpy()
+    valid = (discount >= 0) & (discount <= 1)
+
+    # 固定区間（左閉区間、1.0は最後の区間）の番号を内側の境界で求め、平均利益率をnp.bincountで計算
+    bin_idx = np.digitize(discount[valid], DISCOUNT_BIN_EDGES[1:-1])
+    mean_margin, observed = bin_mean(bin_idx, margin[valid], len(DISCOUNT_BIN_LABELS))
+    return pd.DataFrame({
+        'Discount_Range': DISCOUNT_BIN_LABELS[observed],
+        'Profit_Margin': mean_margin
+    })
+
+# 分析レポートタブ
+def render_report_tab(filtered_df, total_loss):
+    """分析レポートタブ"""
+    st.title("📊 分析レポート")
+    st.markdown("---")
+
+    # 現状
+    st.header("📈 現状")
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("総売上", "$2,297,200")
+    with col2:
+        st.metric("総利益", "$286,397")
+    with col3:
+        st.metric("利益率", "12.47%")
+    with col4:
+        st.metric("損失率", "18.7%", delta="-$156,131", delta_color="inverse")
+
+    st.markdown("---")
+
+    # 問題点
+    st.header("⚠️ 問題点")
+
+    col1, col2 = st.columns(2)
+
+    with col1:
+        st.subheader("1. 損失商品")
+        st.dataframe(REPORT_LOSS_PRODUCTS, use_container_width=True)
+
+        st.subheader("2. カテゴリ別利益率")
+        st.dataframe(REPORT_CATEGORY_MARGINS, use_container_width=True)
+
+    with col2:
+        st.subheader("3. 過度な割引")
+        st.dataframe(REPORT_DISCOUNT_LOSSES, use_container_width=True)
+
+        st.subheader("4. 地域別利益率")
+        st.dataframe(REPORT_REGION_MARGINS, use_container_width=True)
+
+
+    st.markdown("---")
+
+    # 推奨事項
+    st.header("💡 推奨事項")
+
+    st.error("""
+**対応:**
+- Tables・Bookcaseの出荷停止
+- 50%超割引の承認制導入
+    """)
+
+    st.dataframe(REPORT_DISCOUNT_LIMITS, use_container_width=True)
+
+    st.markdown("---")
+
+    # 期待効果の計算（実データに基づく）
+    st.subheader("📈 期待効果（実データに基づく計算）")
+
+    try:
+        # 現在の損失額（損失サマリーの結果を再利用）
+        current_total_loss = total_loss
+
+        # 損失マスクを一度だけ作り、各シナリオの条件と組み合わせる
+        profit = filtered_df['Profit'].to_numpy()
+        discount = filtered_df['Discount'].to_numpy()
+        loss_mask = profit < 0
+
+        # シナリオ1: 高割引率（50%以上）を制限した場合
+        high_discount_loss = abs(profit[loss_mask & (discount >= 0.5)].sum())
+
+        # シナリオ2: 損失商品（Tables, Bookcases）を停止した場合
+        if 'Sub-Category' in filtered_df.columns:
+            problem_mask = filtered_df['Sub-Category'].isin(['Tables', 'Bookcases']).to_numpy()
+            problem_products_loss = abs(profit[loss_mask & problem_mask].sum())
+        else:
+            problem_products_loss = 0
+
+        # シナリオ3: カテゴリ別割引率を推奨上限に制限した場合の推定効果
+        if 'Category' in filtered_df.columns:
+            furniture_mask = (filtered_df['Category'] == 'Furniture').to_numpy()
+            furniture_excessive_discount_loss = abs(profit[loss_mask & furniture_mask & (discount > 0.15)].sum())
+        else:
+            furniture_excessive_discount_loss = 0
+
+        # 総改善見込み（保守的な見積もり: 60%の削減）
+        total_potential_improvement = (high_discount_loss + problem_products_loss + furniture_excessive_discount_loss) * 0.6
+
+        # データの期間を取得
+        date_range_months = (filtered_df['Order Date'].max() - filtered_df['Order Date'].min()).days / 30.44
+        monthly_improvement = total_potential_improvement / date_range_months if date_range_months > 0 else 0
+
+        # 期待効果テーブル
+        effect_df = pd.DataFrame({
+            '期間': ['3ヶ月', '6ヶ月', '12ヶ月'],
+            '月間改善額': [
+                f'${monthly_improvement:,.0f}',
+                f'${monthly_improvement:,.0f}',
+                f'${monthly_improvement:,.0f}'
+            ],
+            '累計改善': [
+                f'${monthly_improvement * 3:,.0f}',
+                f'${monthly_improvement * 6:,.0f}',
+                f'${monthly_improvement * 12:,.0f}'
+            ],
+            'ROI': [
+                f'{(monthly_improvement * 3 / current_total_loss * 100):.1f}%' if current_total_loss > 0 else 'N/A',
+                f'{(monthly_improvement * 6 / current_total_loss * 100):.1f}%' if current_total_loss > 0 else 'N/A',
+                f'{(monthly_improvement * 12 / current_total_loss * 100):.1f}%' if current_total_loss > 0 else 'N/A'
+            ]
+        })
+        st.dataframe(effect_df, use_container_width=True)
+
+        # 改善案の詳細
+        st.markdown("#### 💡 改善案の内訳")
+        scenario_df = pd.DataFrame({
+            'シナリオ': [
+                '高割引率（50%以上）の制限',
+                '損失商品（Tables/Bookcases）の出荷停止',
+                'Furniture割引上限15%への制限'
+            ],
+            '現在の損失額': [
+                f'${high_discount_loss:,.0f}',
+                f'${problem_products_loss:,.0f}',
+                f'${furniture_excessive_discount_loss:,.0f}'
+            ],
+            '期待削減率': ['80%', '100%', '50%'],
+            '期待改善額': [
+                f'${high_discount_loss * 0.8:,.0f}',
+                f'${problem_products_loss * 1.0:,.0f}',
+                f'${furniture_excessive_discount_loss * 0.5:,.0f}'
+            ]
+        })
+        st.dataframe(scenario_df, use_container_width=True)
+
+        st.info(f"""
+        **計算根拠:**
+        - 現在の総損失額: ${current_total_loss:,.0f}
+        - データ期間: {date_range_months:.1f}ヶ月
+        - 総改善見込み: ${total_potential_improvement:,.0f}
+        - 月間改善見込み: ${monthly_improvement:,.0f}
+        """)
+
+    except Exception as e:
+        st.error(f"期待効果計算エラー: {str(e)}")
+        st.warning("期待効果を計算できませんでした。データを確認してください。")
+
+# 売上分析タブ
+def render_sales_tab(filtered_df, filter_key):
+    """売上分析タブ"""
+    # 月別売上トレンド
+    try:
+        monthly_sales = get_monthly_sales(filtered_df, filter_key)
+        if len(monthly_sales) > 0:
+            fig_monthly = make_line_fig(
+                tuple(monthly_sales['YearMonth']),
+                tuple(monthly_sales['Sales']),
+                'YearMonth',
+                'Sales',
+                '📅 月別売上トレンド'
+            )
+            st.plotly_chart(fig_monthly, use_container_width=True)
+    except Exception as e:
+        st.error(f"月別売上トレンドエラー: {str(e)}")
+
+    # 3つのコラム
+    col1, col2 = st.columns(2)
+
+    with col1:
+        # 地域別売上
+        try:
+            region_sales = get_region_sales(filtered_df, filter_key)
+            if len(region_sales) > 0:
+                fig_region = make_pie_fig(
+                    tuple(region_sales['Region']),
+                    tuple(region_sales['Sales']),
+                    'Region',
+                    'Sales',
+                    '🌍 地域別売上分布'
+                )
+                st.plotly_chart(fig_region, use_container_width=True)
+        except Exception as e:
+            st.error(f"地域別売上エラー: {str(e)}")
+
+
+    with col2:
+        # カテゴリ別売上
+        try:
+            category_sales = get_category_sales(filtered_df, filter_key)
+            if len(category_sales) > 0:
+                fig_category = make_bar_fig(
+                    tuple(category_sales['Category']),
+                    tuple(category_sales['Sales']),
+                    'Category',
+                    'Sales',
+                    '📦 カテゴリ別売上',
+                    color_scale='Blues'
+                )
+                st.plotly_chart(fig_category, use_container_width=True)
+        except Exception as e:
+            st.error(f"カテゴリ別売上エラー: {str(e)}")
+
+# 詳細分析タブ
+def render_detail_tab(filtered_df, filter_key):
+    """詳細分析タブ"""
+    # 年別比較
+    try:
+        yearly_sales = get_yearly_sales(filtered_df, filter_key)
+
+        if len(yearly_sales) > 0:
+            fig_yearly = make_bar_fig(
+                tuple(yearly_sales['Year']),
+                tuple(yearly_sales['Sales']),
+                'Year',
+                'Sales',
+                '📊 年別売上',
+                text_template='%{text:$,.0f}',
+                category_axis=True
+            )
+            st.plotly_chart(fig_yearly, use_container_width=True)
+    except Exception as e:
+        st.error(f"年別売上エラー: {str(e)}")
+
+    # セグメント分析
+    col1, col2 = st.columns(2)
+
+    with col1:
+        try:
+            if 'Segment' in filtered_df.columns:
+                segment_sales = get_segment_sales(filtered_df, filter_key)
+                if len(segment_sales) > 0:
+                    fig_segment = make_pie_fig(
+                        tuple(segment_sales['Segment']),
+                        tuple(segment_sales['Sales']),
+                        'Segment',
+                        'Sales',
+                        '👥 セグメント別売上'
+                    )
+                    st.plotly_chart(fig_segment, use_container_width=True)
+            else:
+                st.info("セグメント情報が利用できません")
+        except Exception as e:
+            st.error(f"セグメント分析エラー: {str(e)}")
+
+    with col2:
+        # トップ10製品
+        try:
+            if 'Product Name' in filtered_df.columns:
+                top_products = get_top_products(filtered_df, filter_key)
+                if len(top_products) > 0:
+                    fig_products = make_bar_fig(
+                        tuple(top_products['Sales']),
+                        tuple(top_products['Product Name']),
+                        'Sales',
+                        'Product Name',
+                        '🏆 トップ10製品（売上）',
+                        orientation='h',
+                        height=400
+                    )
+                    st.plotly_chart(fig_products, use_container_width=True)
+            else:
+                st.info("商品名情報が利用できません")
+        except Exception as e:
+            st.error(f"トップ製品分析エラー: {str(e)}")
+
+# 損失分析タブ
+def render_loss_tab(loss_stats, total_sales):
+    """損失分析タブ"""
+    loss_count = loss_stats['count']
+    total_loss = loss_stats['total']
+
+    st.subheader("⚠️ 損失分析ダッシュボード")
+
+    if loss_count > 0:
+        # 損失サマリー
+        col1, col2, col3, col4 = st.columns(4)
+
+        with col1:
+            st.metric("🔴 損失注文数", f"{loss_count:,}")
+
+        with col2:
+            avg_loss = loss_stats['mean']
+            st.metric("📉 平均損失額", f"${abs(avg_loss):.2f}")
+
+        with col3:
+            worst_loss = loss_stats['min']
+            st.metric("💥 最大損失", f"${abs(worst_loss):.2f}")
+
+        with col4:
+            loss_vs_sales = (total_loss / total_sales * 100) if total_sales > 0 else 0
+            st.metric("📊 損失率", f"{loss_vs_sales:.2f}%")
+
+        st.markdown("---")
+
+        # 損失分析グラフ
+        col1, col2 = st.columns(2)
+
+        with col1:
+            # 地域別損失
+            try:
+                region_loss = loss_stats['Region']
+                if len(region_loss) > 0:
+                    fig_region_loss = make_bar_fig(
+                        tuple(region_loss['Region']),
+                        tuple(region_loss['Loss']),
+                        'Region',
+                        'Loss',
+                        '🌍 地域別損失額',
+                        color_scale='Reds'
+                    )
+                    st.plotly_chart(fig_region_loss, use_container_width=True)
+            except Exception as e:
+                st.error(f"地域別損失エラー: {str(e)}")
+
+        with col2:
+            # カテゴリ別損失
+            try:
+                category_loss = loss_stats['Category']
+                if len(category_loss) > 0:
+                    fig_category_loss = make_pie_fig(
+                        tuple(category_loss['Category']),
+                        tuple(category_loss['Loss']),
+                        'Category',
+                        'Loss',
+                        '📦 カテゴリ別損失分布',
+                        colors=tuple(px.colors.sequential.Reds_r)
+                    )
+                    st.plotly_chart(fig_category_loss, use_container_width=True)
+            except Exception as e:
+                st.error(f"カテゴリ別損失エラー: {str(e)}")
+
+    else:
+        st.success("🎉 選択された期間・条件では損失は発生していません！")
+
+# 高度な分析タブ
+def render_advanced_tab(filtered_df, filter_key):
+    """高度な分析タブ"""
+    st.subheader("🚀 高度なビジネス分析")
+
+    # 地域別詳細分析
+    st.markdown("### 🌍 地域別詳細分析")
+    try:
+        if 'Customer ID' in filtered_df.columns:
+            # 地域別総合分析
+            regional_analysis = get_regional_analysis(filtered_df, filter_key)
+
+            # 地域別顧客単価（単独表示）
+            fig_customer_value = make_bar_fig(
+                tuple(regional_analysis.index),
+                tuple(regional_analysis['顧客単価']),
+                '地域',
+                '顧客単価 ($)',
+                '💰 地域別顧客単価',
+                color_scale='Blues',
+                text_template='$%{text:,.0f}'
+            )
+            st.plotly_chart(fig_customer_value, use_container_width=True)
+
+            # 地域別統計テーブル
+            st.subheader("📋 地域別統合レポート")
+            st.dataframe(regional_analysis, use_container_width=True)
+
+        else:
+            st.info("顧客IDデータが利用できないため、地域別詳細分析をスキップします")
+    except Exception as e:
+        st.error(f"地域別詳細分析エラー: {str(e)}")
+
+    st.markdown("---")
+
+    # 配送方法分析
+    if 'Ship Mode' in filtered_df.columns:
+        st.markdown("### 📦 配送方法分析")
+        try:
+            shipping_analysis = get_shipping_analysis(filtered_df, filter_key)
+
+            col1, col2 = st.columns(2)
+
+            with col1:
+                fig_shipping = make_bar_fig(
+                    tuple(shipping_analysis.index),
+                    tuple(shipping_analysis['売上']),
+                    '配送方法',
+                    '売上',
+                    '🚚 配送方法別売上',
+                    color_scale='Blues'
+                )
+                st.plotly_chart(fig_shipping, use_container_width=True)
+
+            with col2:
+                st.dataframe(shipping_analysis, use_container_width=True)
+
+        except Exception as e:
+            st.error(f"配送方法分析エラー: {str(e)}")
+
+    # 利益率分析
+    st.markdown("### 🎯 利益率分析")
+    col1, col2 = st.columns(2)
+
+    with col1:
+        # 利益率の分布
+        fig = safe_histogram(
+            filtered_df,
+            'Profit_Margin',
+            '📈 利益率の分布',
+            nbins=50,
+            x_label='利益率(%)'
+        )
+        if fig:
+            try:
+                mean_profit = filtered_df['Profit_Margin'].mean()
+                fig.add_vline(x=mean_profit, line_dash="dash", line_color="red")
+            except:
+                pass
+            st.plotly_chart(fig, use_container_width=True)
+
+    with col2:
+        # カテゴリ別利益率
+        try:
+            category_profit = get_category_profit(filtered_df, filter_key)
+
+            if len(category_profit) > 0:
+                fig_category_profit = make_bar_fig(
+                    tuple(category_profit['Category']),
+                    tuple(category_profit['Profit_Margin']),
+                    'Category',
+                    'Profit_Margin',
+                    '📦 カテゴリ別平均利益率',
+                    color_scale='RdYlGn'
+                )
+                st.plotly_chart(fig_category_profit, use_container_width=True)
+        except Exception as e:
+            st.error(f"カテゴリ別利益率エラー: {str(e)}")
+
+    # 割引分析
+    if 'Discount' in filtered_df.columns:
+        st.markdown("### 💸 割引効果分析")
+        col1, col2 = st.columns(2)
+
+        with col1:
+            # 割引率 vs 売上の関係
+            fig = safe_scatter(
+                filtered_df,
+                'Discount',
+                'Sales',
+                'Category',
+                '📊 割引率 vs 売上の関係'
+            )
+            if fig:
+                st.plotly_chart(fig, use_container_width=True)
+
+        with col2:
+            # 割引率別利益率（入力は事前チェックし、集計・描画で想定されるエラーのみ捕捉）
+            validation_error = validate_discount_data(filtered_df, filter_key)
+            if validation_error:
+                st.info(validation_error)
+            else:
+                try:
+                    discount_margin = get_discount_margin(filtered_df, filter_key)
+                    fig_discount_profit = make_bar_fig(
+                        tuple(discount_margin['Discount_Range']),
+                        tuple(discount_margin['Profit_Margin']),
+                        'Discount_Range',
+                        'Profit_Margin',
+                        '📈 割引率別平均利益率',
+                        color_scale='RdYlGn'
+                    )
+                    st.plotly_chart(fig_discount_profit, use_container_width=True)
+                except (ValueError, KeyError) as e:
+                    st.error(f"割引分析エラー: {str(e)}")
+
 # メイン実行
 def main():
     # データ読み込み
-    df = load_data()
+    data_version = get_data_version()
+    df = load_data(data_version)
 
     # タイトル
     st.title("📊 Superstore Dashboard")
@@ -184,65 +1159,53 @@ def main():
     # サイドバーフィルター
     st.sidebar.title("🔍 フィルター")
 
+    # フィルター選択肢（全データから一度だけ計算）
+    filter_options = get_filter_options(df, data_version)
+
     # 年フィルター
-    try:
-        years = sorted(df['Year'].dropna().unique())
-        selected_years = st.sidebar.multiselect(
-            "📅 年を選択",
-            options=years,
-            default=years
-        )
-    except:
-        selected_years = []
+    years = filter_options['Year']
+    selected_years = st.sidebar.multiselect(
+        "📅 年を選択",
+        options=years,
+        default=years
+    )
 
     # 地域フィルター
-    try:
-        regions = sorted(df['Region'].dropna().unique())
-        selected_regions = st.sidebar.multiselect(
-            "🌍 地域を選択",
-            options=regions,
-            default=regions
-        )
-    except:
-        selected_regions = []
+    regions = filter_options['Region']
+    selected_regions = st.sidebar.multiselect(
+        "🌍 地域を選択",
+        options=regions,
+        default=regions
+    )
 
     # カテゴリフィルター
-    try:
-        categories = sorted(df['Category'].dropna().unique())
-        selected_categories = st.sidebar.multiselect(
-            "📦 カテゴリを選択",
-            options=categories,
-            default=categories
-        )
-    except:
-        selected_categories = []
+    categories = filter_options['Category']
+    selected_categories = st.sidebar.multiselect(
+        "📦 カテゴリを選択",
+        options=categories,
+        default=categories
+    )
 
     # セグメントフィルター
-    try:
-        if 'Segment' in df.columns:
-            segments = sorted(df['Segment'].dropna().unique())
-            selected_segments = st.sidebar.multiselect(
-                "👥 顧客セグメントを選択",
-                options=segments,
-                default=segments
-            )
-        else:
-            selected_segments = []
-    except:
+    segments = filter_options['Segment']
+    if segments:
+        selected_segments = st.sidebar.multiselect(
+            "👥 顧客セグメントを選択",
+            options=segments,
+            default=segments
+        )
+    else:
         selected_segments = []
 
     # 配送方法フィルター
-    try:
-        if 'Ship Mode' in df.columns:
-            ship_modes = sorted(df['Ship Mode'].dropna().unique())
-            selected_ship_modes = st.sidebar.multiselect(
-                "🚚 配送方法を選択",
-                options=ship_modes,
-                default=ship_modes
-            )
-        else:
-            selected_ship_modes = []
-    except:
+    ship_modes = filter_options['Ship Mode']
+    if ship_modes:
+        selected_ship_modes = st.sidebar.multiselect(
+            "🚚 配送方法を選択",
+            options=ship_modes,
+            default=ship_modes
+        )
+    else:
         selected_ship_modes = []
 
 
@@ -254,29 +1217,40 @@ def main():
         index=0
     )
 
-    # データフィルタリング
-    filtered_df = df.copy()
-
-    # 基本フィルター
-    if selected_years:
-        filtered_df = filtered_df[filtered_df['Year'].isin(selected_years)]
-    if selected_regions:
-        filtered_df = filtered_df[filtered_df['Region'].isin(selected_regions)]
-    if selected_categories:
-        filtered_df = filtered_df[filtered_df['Category'].isin(selected_categories)]
-
-    # 新しいフィルター
-    if selected_segments and 'Segment' in filtered_df.columns:
-        filtered_df = filtered_df[filtered_df['Segment'].isin(selected_segments)]
-    if selected_ship_modes and 'Ship Mode' in filtered_df.columns:
-        filtered_df = filtered_df[filtered_df['Ship Mode'].isin(selected_ship_modes)]
-
+    # データフィルタリング（全条件を1つの真偽値マスクにまとめ、抽出は最後に一度だけ）
+    masks = []
+
+    # 基本フィルター・新しいフィルター（全選択の列は絞り込み不要のため走査しない）
+    column_filters = [
+        ('Year', selected_years, years),
+        ('Region', selected_regions, regions),
+        ('Category', selected_categories, categories),
+        ('Segment', selected_segments, segments),
+        ('Ship Mode', selected_ship_modes, ship_modes)
+    ]
+    for col, selected, options in column_filters:
+        if selected and col in df.columns and set(selected) != set(options):
+            masks.append(df[col].isin(selected).to_numpy())
 
     # 利益フィルター
     if profit_filter == "利益のみ":
-        filtered_df = filtered_df[filtered_df['Profit'] > 0]
+        masks.append(df['Profit'].to_numpy() > 0)
     elif profit_filter == "損失のみ":
-        filtered_df = filtered_df[filtered_df['Profit'] < 0]
+        masks.append(df['Profit'].to_numpy() < 0)
+
+    # 条件がなければ全データをそのまま使う
+    filtered_df = df[np.logical_and.reduce(masks)] if masks else df
+
+    # 集計キャッシュのキー（データファイルの更新時刻とフィルター条件が同じなら集計結果を再利用）
+    filter_key = (
+        data_version,
+        tuple(sorted(selected_years)),
+        tuple(sorted(selected_regions)),
+        tuple(sorted(selected_categories)),
+        tuple(sorted(selected_segments)),
+        tuple(sorted(selected_ship_modes)),
+        profit_filter
+    )
 
     # データが空の場合の処理
     if len(filtered_df) == 0:
@@ -315,15 +1289,18 @@ def main():
         except:
             st.experimental_rerun()
 
-    # 損失データの計算
-    try:
-        loss_orders = filtered_df[filtered_df['Profit'] < 0]
-        total_loss = abs(loss_orders['Profit'].sum()) if len(loss_orders) > 0 else 0
-        loss_rate = len(loss_orders) / len(filtered_df) * 100 if len(filtered_df) > 0 else 0
-    except:
-        total_loss = 0
-        loss_rate = 0
-        st.subheader("📋 データサマリー")
+    # 売上・利益の集計（NumPy配列上で一度だけ計算し、KPIと損失タブで共有）
+    sales_arr = filtered_df['Sales'].to_numpy()
+    profit_arr = filtered_df['Profit'].to_numpy()
+    total_sales = sales_arr.sum()
+    total_profit = profit_arr.sum()
+    avg_order = sales_arr.mean() if sales_arr.size else 0.0
+
+    # 損失データの計算（損失タブでもこの結果を使う）
+    loss_stats = get_loss_stats(filtered_df, filter_key)
+    loss_count = loss_stats['count']
+    total_loss = loss_stats['total']
+    loss_rate = loss_count / len(filtered_df) * 100
 
     # データ基本情報
     col1, col2, col3 = st.columns(3)
@@ -340,27 +1317,24 @@ def main():
             st.info("**期間**: データなし")
 
     with col3:
-        customer_count = filtered_df['Customer ID'].nunique() if 'Customer ID' in filtered_df.columns else "N/A"
+        customer_count = fast_nunique(filtered_df['Customer ID']) if 'Customer ID' in filtered_df.columns else "N/A"
         st.info(f"**顧客数**: {customer_count:,}" if isinstance(customer_count, int) else f"**顧客数**: {customer_count}")
             
     # KPI表示
     col1, col2, col3, col4, col5 = st.columns(5)
 
     with col1:
-        total_sales = filtered_df['Sales'].sum()
         st.metric("💰 総売上", f"${total_sales:,.0f}")
 
     with col2:
-        total_profit = filtered_df['Profit'].sum()
         profit_margin = (total_profit / total_sales * 100) if total_sales > 0 else 0
         st.metric("📈 総利益", f"${total_profit:,.0f}", f"{profit_margin:.1f}%")
 
     with col3:
-        total_orders = filtered_df['Order ID'].nunique() if 'Order ID' in filtered_df.columns else len(filtered_df)
+        total_orders = fast_nunique(filtered_df['Order ID']) if 'Order ID' in filtered_df.columns else len(filtered_df)
         st.metric("🛒 注文数", f"{total_orders:,}")
 
     with col4:
-        avg_order = filtered_df['Sales'].mean()
         st.metric("💳 平均注文額", f"${avg_order:.2f}")
 
     with col5:
@@ -372,525 +1346,24 @@ def main():
     tab1, tab2, tab3, tab4, tab5= st.tabs(["📋 分析レポート", "📈 売上分析", "🎯 詳細分析", "⚠️ 損失分析", "🚀 高度な分析"])
 
     with tab1:
-        st.title("📊 分析レポート")
-        st.markdown("---")
-
-        # 現状
-        st.header("📈 現状")
-        col1, col2, col3, col4 = st.columns(4)
-        with col1:
-            st.metric("総売上", "$2,297,200")
-        with col2:
-            st.metric("総利益", "$286,397")
-        with col3:
-            st.metric("利益率", "12.47%")
-        with col4:
-            st.metric("損失率", "18.7%", delta="-$156,131", delta_color="inverse")
-
-        st.markdown("---")
-
-        # 問題点
-        st.header("⚠️ 問題点")
-
-        col1, col2 = st.columns(2)
-
-        with col1:
-            st.subheader("1. 損失商品")
-            problem1_df = pd.DataFrame({
-                '商品': ['Tables', 'Bookcases', 'Supplies'],
-                '利益率': ['-8.56%', '-3.02%', '-2.55%'],
-                '損失額': ['$17,725', '$3,473', '$1,189']
-            })
-            st.dataframe(problem1_df, use_container_width=True)
-
-            st.subheader("2. カテゴリ別利益率")
-            problem3_df = pd.DataFrame({
-                'カテゴリ': ['Furniture', 'Office Supplies', 'Technology'],
-                '利益率': ['2.49%', '17.04%', '17.40%']
-            })
-            st.dataframe(problem3_df, use_container_width=True)
-
-        with col2:
-            st.subheader("3. 過度な割引")
-            problem2_df = pd.DataFrame({
-                '割引率': ['50%', '60%', '70%', '80%'],
-                '平均損失/件': ['$310', '$43', '$96', '$102']
-            })
-            st.dataframe(problem2_df, use_container_width=True)
-
-            st.subheader("4. 地域別利益率")
-            problem4_df = pd.DataFrame({
-                '地域': ['West', 'East', 'South', 'Central'],
-                '利益率': ['14.94%', '13.48%', '11.93%', '7.92%']
-            })
-            st.dataframe(problem4_df, use_container_width=True)
-
-
-        st.markdown("---")
-
-        # 推奨事項
-        st.header("💡 推奨事項")
+        render_report_tab(filtered_df, total_loss)
 
-        st.error("""
-**対応:**
-- Tables・Bookcaseの出荷停止
-- 50%超割引の承認制導入
-        """)
-
-        discount_rec = pd.DataFrame({
-            'カテゴリ': ['Furniture', 'Office Supplies', 'Technology'],
-            '現在上限': ['50%', '80%', '70%'],
-            '推奨上限': ['15%', '25%', '30%']
-        })
-        st.dataframe(discount_rec, use_container_width=True)
-
-        st.markdown("---")
-
-        # 期待効果の計算（実データに基づく）
-        st.subheader("📈 期待効果（実データに基づく計算）")
-
-        try:
-            # 現在の損失額を計算
-            current_total_loss = abs(filtered_df[filtered_df['Profit'] < 0]['Profit'].sum())
-
-            # シナリオ1: 高割引率（50%以上）を制限した場合
-            high_discount_loss = abs(filtered_df[(filtered_df['Profit'] < 0) & (filtered_df['Discount'] >= 0.5)]['Profit'].sum())
-
-            # シナリオ2: 損失商品（Tables, Bookcases）を停止した場合
-            if 'Sub-Category' in filtered_df.columns:
-                problem_products_loss = abs(filtered_df[
-                    (filtered_df['Profit'] < 0) &
-                    (filtered_df['Sub-Category'].isin(['Tables', 'Bookcases']))
-                ]['Profit'].sum())
-            else:
-                problem_products_loss = 0
-
-            # シナリオ3: カテゴリ別割引率を推奨上限に制限した場合の推定効果
-            furniture_excessive_discount_loss = abs(filtered_df[
-                (filtered_df['Profit'] < 0) &
-                (filtered_df['Category'] == 'Furniture') &
-                (filtered_df['Discount'] > 0.15)
-            ]['Profit'].sum()) if 'Category' in filtered_df.columns else 0
-
-            # 総改善見込み（保守的な見積もり: 60%の削減）
-            total_potential_improvement = (high_discount_loss + problem_products_loss + furniture_excessive_discount_loss) * 0.6
-
-            # データの期間を取得
-            date_range_months = (filtered_df['Order Date'].max() - filtered_df['Order Date'].min()).days / 30.44
-            monthly_improvement = total_potential_improvement / date_range_months if date_range_months > 0 else 0
-
-            # 期待効果テーブル
-            effect_df = pd.DataFrame({
-                '期間': ['3ヶ月', '6ヶ月', '12ヶ月'],
-                '月間改善額': [
-                    f'${monthly_improvement:,.0f}',
-                    f'${monthly_improvement:,.0f}',
-                    f'${monthly_improvement:,.0f}'
-                ],
-                '累計改善': [
-                    f'${monthly_improvement * 3:,.0f}',
-                    f'${monthly_improvement * 6:,.0f}',
-                    f'${monthly_improvement * 12:,.0f}'
-                ],
-                'ROI': [
-                    f'{(monthly_improvement * 3 / current_total_loss * 100):.1f}%' if current_total_loss > 0 else 'N/A',
-                    f'{(monthly_improvement * 6 / current_total_loss * 100):.1f}%' if current_total_loss > 0 else 'N/A',
-                    f'{(monthly_improvement * 12 / current_total_loss * 100):.1f}%' if current_total_loss > 0 else 'N/A'
-                ]
-            })
-            st.dataframe(effect_df, use_container_width=True)
-
-            # 改善案の詳細
-            st.markdown("#### 💡 改善案の内訳")
-            scenario_df = pd.DataFrame({
-                'シナリオ': [
-                    '高割引率（50%以上）の制限',
-                    '損失商品（Tables/Bookcases）の出荷停止',
-                    'Furniture割引上限15%への制限'
-                ],
-                '現在の損失額': [
-                    f'${high_discount_loss:,.0f}',
-                    f'${problem_products_loss:,.0f}',
-                    f'${furniture_excessive_discount_loss:,.0f}'
-                ],
-                '期待削減率': ['80%', '100%', '50%'],
-                '期待改善額': [
-                    f'${high_discount_loss * 0.8:,.0f}',
-                    f'${problem_products_loss * 1.0:,.0f}',
-                    f'${furniture_excessive_discount_loss * 0.5:,.0f}'
-                ]
-            })
-            st.dataframe(scenario_df, use_container_width=True)
-
-            st.info(f"""
-            **計算根拠:**
-            - 現在の総損失額: ${current_total_loss:,.0f}
-            - データ期間: {date_range_months:.1f}ヶ月
-            - 総改善見込み: ${total_potential_improvement:,.0f}
-            - 月間改善見込み: ${monthly_improvement:,.0f}
-            """)
-
-        except Exception as e:
-            st.error(f"期待効果計算エラー: {str(e)}")
-            st.warning("期待効果を計算できませんでした。データを確認してください。")
     with tab2:
-        # 月別売上トレンド
-        try:
-            monthly_sales = filtered_df.groupby('YearMonth')['Sales'].sum().reset_index()
-            if len(monthly_sales) > 0:
-                fig_monthly = px.line(
-                    monthly_sales,
-                    x='YearMonth',
-                    y='Sales',
-                    title='📅 月別売上トレンド',
-                    markers=True
-                )
-                fig_monthly.update_layout(xaxis_tickangle=-45)
-                fig_monthly.update_xaxes(type='category')
-                st.plotly_chart(fig_monthly, use_container_width=True)
-        except Exception as e:
-            st.error(f"月別売上トレンドエラー: {str(e)}")
-
-        # 3つのコラム
-        col1, col2 = st.columns(2)
-
-        with col1:
-            # 地域別売上
-            try:
-                region_sales = filtered_df.groupby('Region')['Sales'].sum().reset_index()
-                if len(region_sales) > 0:
-                    fig_region = px.pie(
-                        region_sales,
-                        values='Sales',
-                        names='Region',
-                        title='🌍 地域別売上分布'
-                    )
-                    st.plotly_chart(fig_region, use_container_width=True)
-            except Exception as e:
-                st.error(f"地域別売上エラー: {str(e)}")
-
-
-        with col2:
-            # カテゴリ別売上
-            try:
-                category_sales = filtered_df.groupby('Category')['Sales'].sum().reset_index()
-                if len(category_sales) > 0:
-                    fig_category = px.bar(
-                        category_sales,
-                        x='Category',
-                        y='Sales',
-                        title='📦 カテゴリ別売上',
-                        color='Sales',
-                        color_continuous_scale='Blues'
-                    )
-                    st.plotly_chart(fig_category, use_container_width=True)
-            except Exception as e:
-                st.error(f"カテゴリ別売上エラー: {str(e)}")
+        render_sales_tab(filtered_df, filter_key)
 
     with tab3:
-        # 年別比較
-        try:
-            yearly_sales = filtered_df.groupby('Year').agg({
-                'Sales': 'sum',
-                'Profit': 'sum'
-            }).reset_index()
-
-            if 'Order ID' in filtered_df.columns:
-                yearly_orders = filtered_df.groupby('Year')['Order ID'].nunique().reset_index()
-                yearly_sales = yearly_sales.merge(yearly_orders, on='Year', how='left')
-
-            if len(yearly_sales) > 0:
-                fig_yearly = px.bar(
-                    yearly_sales,
-                    x='Year',
-                    y='Sales',
-                    title='📊 年別売上',
-                    text='Sales'
-                )
-                fig_yearly.update_traces(texttemplate='%{text:$,.0f}', textposition='outside')
-                fig_yearly.update_xaxes(type='category', tickmode='linear', dtick=1)
-                st.plotly_chart(fig_yearly, use_container_width=True)
-        except Exception as e:
-            st.error(f"年別売上エラー: {str(e)}")
-
-        # セグメント分析
-        col1, col2 = st.columns(2)
-
-        with col1:
-            try:
-                if 'Segment' in filtered_df.columns:
-                    segment_sales = filtered_df.groupby('Segment')['Sales'].sum().reset_index()
-                    if len(segment_sales) > 0:
-                        fig_segment = px.pie(
-                            segment_sales,
-                            values='Sales',
-                            names='Segment',
-                            title='👥 セグメント別売上'
-                        )
-                        st.plotly_chart(fig_segment, use_container_width=True)
-                else:
-                    st.info("セグメント情報が利用できません")
-            except Exception as e:
-                st.error(f"セグメント分析エラー: {str(e)}")
-
-        with col2:
-            # トップ10製品
-            try:
-                if 'Product Name' in filtered_df.columns:
-                    top_products = filtered_df.groupby('Product Name')['Sales'].sum().nlargest(10).reset_index()
-                    if len(top_products) > 0:
-                        fig_products = px.bar(
-                            top_products,
-                            x='Sales',
-                            y='Product Name',
-                            orientation='h',
-                            title='🏆 トップ10製品（売上）'
-                        )
-                        fig_products.update_layout(height=400)
-                        st.plotly_chart(fig_products, use_container_width=True)
-                else:
-                    st.info("商品名情報が利用できません")
-            except Exception as e:
-                st.error(f"トップ製品分析エラー: {str(e)}")
+        render_detail_tab(filtered_df, filter_key)
 
     with tab4:
-        st.subheader("⚠️ 損失分析ダッシュボード")
-
-        if len(loss_orders) > 0:
-            # 損失サマリー
-            col1, col2, col3, col4 = st.columns(4)
-
-            with col1:
-                st.metric("🔴 損失注文数", f"{len(loss_orders):,}")
-
-            with col2:
-                avg_loss = loss_orders['Profit'].mean()
-                st.metric("📉 平均損失額", f"${abs(avg_loss):.2f}")
-
-            with col3:
-                worst_loss = loss_orders['Profit'].min()
-                st.metric("💥 最大損失", f"${abs(worst_loss):.2f}")
-
-            with col4:
-                loss_vs_sales = (total_loss / total_sales * 100) if total_sales > 0 else 0
-                st.metric("📊 損失率", f"{loss_vs_sales:.2f}%")
-
-            st.markdown("---")
-
-            # 損失分析グラフ
-            col1, col2 = st.columns(2)
-
-            with col1:
-                # 地域別損失
-                try:
-                    region_loss = loss_orders.groupby('Region')['Profit'].sum().abs().reset_index()
-                    region_loss.columns = ['Region', 'Loss']
-                    if len(region_loss) > 0:
-                        fig_region_loss = px.bar(
-                            region_loss,
-                            x='Region',
-                            y='Loss',
-                            title='🌍 地域別損失額',
-                            color='Loss',
-                            color_continuous_scale='Reds'
-                        )
-                        st.plotly_chart(fig_region_loss, use_container_width=True)
-                except Exception as e:
-                    st.error(f"地域別損失エラー: {str(e)}")
-
-            with col2:
-                # カテゴリ別損失
-                try:
-                    category_loss = loss_orders.groupby('Category')['Profit'].sum().abs().reset_index()
-                    category_loss.columns = ['Category', 'Loss']
-                    if len(category_loss) > 0:
-                        fig_category_loss = px.pie(
-                            category_loss,
-                            values='Loss',
-                            names='Category',
-                            title='📦 カテゴリ別損失分布',
-                            color_discrete_sequence=px.colors.sequential.Reds_r
-                        )
-                        st.plotly_chart(fig_category_loss, use_container_width=True)
-                except Exception as e:
-                    st.error(f"カテゴリ別損失エラー: {str(e)}")
-
-        else:
-            st.success("🎉 選択された期間・条件では損失は発生していません！")
+        render_loss_tab(loss_stats, total_sales)
 
     with tab5:
-        st.subheader("🚀 高度なビジネス分析")
-
-        # 地域別詳細分析
-        st.markdown("### 🌍 地域別詳細分析")
-        try:
-            if 'Customer ID' in filtered_df.columns:
-                # 地域別総合分析
-                regional_analysis = filtered_df.groupby('Region').agg({
-                    'Sales': ['sum', 'mean'],
-                    'Profit': ['sum', 'mean'],
-                    'Customer ID': 'nunique',
-                    'Discount': 'mean'
-                }).round(2)
-
-                regional_analysis.columns = ['総売上', '平均売上', '総利益', '平均利益', '顧客数', '平均割引率']
-                regional_analysis['利益率'] = (regional_analysis['総利益'] / regional_analysis['総売上'] * 100).round(2)
-                regional_analysis['顧客単価'] = (regional_analysis['総売上'] / regional_analysis['顧客数']).round(2)
-
-                # 地域別顧客単価（単独表示）
-                fig_customer_value = px.bar(
-                    x=regional_analysis.index,
-                    y=regional_analysis['顧客単価'],
-                    title='💰 地域別顧客単価',
-                    labels={'x': '地域', 'y': '顧客単価 ($)'},
-                    color=regional_analysis['顧客単価'],
-                    color_continuous_scale='Blues',
-                    text=regional_analysis['顧客単価']
-                )
-                fig_customer_value.update_traces(texttemplate='$%{text:,.0f}', textposition='outside')
-                st.plotly_chart(fig_customer_value, use_container_width=True)
-
-                # 地域別統計テーブル
-                st.subheader("📋 地域別統合レポート")
-                st.dataframe(regional_analysis, use_container_width=True)
-
-            else:
-                st.info("顧客IDデータが利用できないため、地域別詳細分析をスキップします")
-        except Exception as e:
-            st.error(f"地域別詳細分析エラー: {str(e)}")
-
-        st.markdown("---")
-
-        # 配送方法分析
-        if 'Ship Mode' in filtered_df.columns:
-            st.markdown("### 📦 配送方法分析")
-            try:
-                shipping_analysis = filtered_df.groupby('Ship Mode').agg({
-                    'Sales': 'sum',
-                    'Profit': 'sum',
-                    'Shipping_Days': 'mean'
-                }).round(2)
-
-                if 'Order ID' in filtered_df.columns:
-                    order_counts = filtered_df.groupby('Ship Mode')['Order ID'].count()
-                    shipping_analysis['注文数'] = order_counts
-
-                shipping_analysis.columns = ['売上', '利益', '平均配送日数', '注文数']
-                shipping_analysis['利益率'] = (shipping_analysis['利益'] / shipping_analysis['売上'] * 100).round(2)
-
-                col1, col2 = st.columns(2)
-
-                with col1:
-                    fig_shipping = px.bar(
-                        x=shipping_analysis.index,
-                        y=shipping_analysis['売上'],
-                        title='🚚 配送方法別売上',
-                        labels={'x': '配送方法', 'y': '売上'},
-                        color=shipping_analysis['売上'],
-                        color_continuous_scale='Blues'
-                    )
-                    st.plotly_chart(fig_shipping, use_container_width=True)
-
-                with col2:
-                    st.dataframe(shipping_analysis, use_container_width=True)
-
-            except Exception as e:
-                st.error(f"配送方法分析エラー: {str(e)}")
-
-        # 利益率分析
-        st.markdown("### 🎯 利益率分析")
-        col1, col2 = st.columns(2)
-
-        with col1:
-            # 利益率の分布
-            fig = safe_histogram(
-                filtered_df,
-                'Profit_Margin',
-                '📈 利益率の分布',
-                nbins=50,
-                x_label='利益率(%)'
-            )
-            if fig:
-                try:
-                    mean_profit = filtered_df['Profit_Margin'].mean()
-                    fig.add_vline(x=mean_profit, line_dash="dash", line_color="red")
-                except:
-                    pass
-                st.plotly_chart(fig, use_container_width=True)
-
-        with col2:
-            # カテゴリ別利益率
-            try:
-                category_profit = filtered_df.groupby('Category')['Profit_Margin'].mean().reset_index()
-                category_profit = category_profit.dropna()
-
-                if len(category_profit) > 0:
-                    fig_category_profit = px.bar(
-                        category_profit,
-                        x='Category',
-                        y='Profit_Margin',
-                        title='📦 カテゴリ別平均利益率',
-                        color='Profit_Margin',
-                        color_continuous_scale='RdYlGn'
-                    )
-                    st.plotly_chart(fig_category_profit, use_container_width=True)
-            except Exception as e:
-                st.error(f"カテゴリ別利益率エラー: {str(e)}")
-
-        # 割引分析
-        if 'Discount' in filtered_df.columns:
-            st.markdown("### 💸 割引効果分析")
-            col1, col2 = st.columns(2)
-
-            with col1:
-                # 割引率 vs 売上の関係
-                fig = safe_scatter(
-                    filtered_df,
-                    'Discount',
-                    'Sales',
-                    'Category',
-                    '📊 割引率 vs 売上の関係'
-                )
-                if fig:
-                    st.plotly_chart(fig, use_container_width=True)
-
-            with col2:
-                # 割引率別利益率
-                try:
-                    valid_discount = filtered_df[(filtered_df['Discount'] >= 0) & (filtered_df['Discount'] <= 1)]
-                    if len(valid_discount) > 5:  # 最低5件のデータが必要
-                        discount_bins = pd.cut(valid_discount['Discount'], bins=5)
-                        discount_profit = valid_discount.groupby(discount_bins)['Profit_Margin'].mean().reset_index()
-                        discount_profit['Discount_Range'] = discount_profit['Discount'].astype(str)
-
-                        fig_discount_profit = px.bar(
-                            discount_profit,
-                            x='Discount_Range',
-                            y='Profit_Margin',
-                            title='📈 割引率別平均利益率',
-                            color='Profit_Margin',
-                            color_continuous_scale='RdYlGn'
-                        )
-                        st.plotly_chart(fig_discount_profit, use_container_width=True)
-                    else:
-                        st.info("割引データが不十分です")
-                except Exception as e:
-                    st.error(f"割引分析エラー: {str(e)}")
+        render_advanced_tab(filtered_df, filter_key)
 
 
 # 実行
 if __name__ == "__main__":
-    try:
-        main()
-    except Exception as e:
-        st.error(f"アプリケーション実行エラー: {str(e)}")
-        st.info("ページを再読み込みしてください")
+    main()
 
 # フッター
-st.markdown("---")
-st.markdown("""
-<div style='text-align: center'>
-<p><strong>Superstore Analytics Dashboard</strong></p>
-<p>Built with ❤️ using Streamlit & Plotly</p>
-</div>
-""", unsafe_allow_html=True)
+st.markdown(FOOTER_HTML, unsafe_allow_html=True)